@@ -1,19 +1,33 @@
-import csv
-import math
+import asyncio
 import logging
-from io import StringIO
+import os
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from io import BytesIO
 from pathlib import Path
 from typing import Any, Dict, List
 
 import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as pa_feather
 from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.requests import Request
 from fastapi.middleware.cors import CORSMiddleware
 
+try:
+    import hyperscan  # optional: DFA substring scan for long machine-ID queries
+except ImportError:
+    hyperscan = None
+
 # -------------------------------------------
 # PATHS
 # -------------------------------------------
@@ -23,8 +37,53 @@ STATIC_DIR = BASE_DIR / "static"
 DATA_DIR = BASE_DIR / "data"
 CSV_PATH = DATA_DIR / "company_data.csv"
 XLSX_PATH = DATA_DIR / "company_data.xlsx"
+FEATHER_PATH = DATA_DIR / "company_data.feather"
+FEATHER_SOURCE_KEY = b"source_stat"  # schema metadata: stat of the CSV the cache was parsed from  # Arrow IPC cache of the parsed CSV
+
+
+# -------------------------------------------
+# JSON RESPONSE (orjson; NaN / Inf / NA / NaT -> null)
+# -------------------------------------------
+def _orjson_default(v: Any) -> Any:
+    # orjson already writes NaN/Inf as null and handles numpy via OPT_SERIALIZE_NUMPY
+    if v is pd.NA or v is pd.NaT:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(v).__name__}")
+
+
+def orjson_dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content,
+        default=_orjson_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class SafeORJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson_dumps(content)
+
+
+# -------------------------------------------
+# STARTUP WARM-UP (parse + build search indexes before serving traffic)
+# -------------------------------------------
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    try:
+        await asyncio.to_thread(load_data)
+    except Exception:
+        # don't block startup; endpoints retry and report the error as JSON
+        logger.exception("Dataset warm-up failed")
+    yield
 
-app = FastAPI(title="Dataset Explorer (CSV/Excel Search + Export)")
+
+app = FastAPI(
+    title="Dataset Explorer (CSV/Excel Search + Export)",
+    default_response_class=SafeORJSONResponse,
+    lifespan=lifespan,
+)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 templates = Jinja2Templates(directory=str(TEMPLATE_DIR))
 
@@ -43,7 +102,12 @@ logger = logging.getLogger("uvicorn")
 # -------------------------------------------
 # DATA CACHE
 # -------------------------------------------
-_df_cache = {"mtime": None, "path": None, "df": None}
+SEARCH_COLUMNS = ("native_pin", "country", "state", "city")
+LOCATION_SEP = "\x1f"  # unit separator: keeps matches from spanning fields
+# swapped whole on reload; request handlers read it once and use that snapshot
+_df_cache: Dict[str, Any] = {"mtime": None, "path": None, "df": None}
+_load_lock = threading.Lock()
+SCAN_CHUNK_ROWS = 65536  # early-exit granularity for limited searches
 
 
 def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -51,8 +115,192 @@ def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def load_data() -> pd.DataFrame:
-    """Load CSV (preferred) or XLSX with caching by file modified time."""
+def _dedup_columns(tbl: pa.Table) -> pa.Table:
+    """Rename repeated headers to name.1, name.2, ... the way pandas.read_csv does."""
+    header, names, counts = set(tbl.column_names), [], {}
+    for col in tbl.column_names:
+        base, cur = col, counts.get(col, 0)
+        while cur > 0:
+            counts[base] = cur + 1
+            col = f"{base}.{cur}"
+            cur = cur + 1 if col in header else counts.get(col, 0)
+        names.append(col)
+        counts[col] = cur + 1
+    return tbl if names == tbl.column_names else tbl.rename_columns(names)
+
+
+def _parse_csv(path: Path) -> pa.Table:
+    """Multithreaded Arrow CSV parse."""
+    convert_options = pa_csv.ConvertOptions(strings_can_be_null=True)
+    tbl = pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(encoding="utf8"),
+                          convert_options=convert_options)
+    # Arrow doesn't raise on invalid UTF-8; such columns come back as binary
+    if any(pa.types.is_binary(f.type) for f in tbl.schema):
+        tbl = pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(encoding="latin1"),
+                              convert_options=convert_options)
+    return _dedup_columns(tbl)
+
+
+def _source_stat(path: Path) -> bytes:
+    st = path.stat()
+    return f"{st.st_mtime_ns}:{st.st_size}".encode()
+
+
+def _write_feather_cache(tbl: pa.Table, source_stat: bytes) -> None:
+    # uncompressed so the next load can memory-map it; never fatal (read-only disks)
+    # unique temp name so concurrent workers never publish each other's partial file
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=FEATHER_PATH.name + ".",
+                                         suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)
+        metadata = {**(tbl.schema.metadata or {}), FEATHER_SOURCE_KEY: source_stat}
+        pa_feather.write_feather(tbl.replace_schema_metadata(metadata), tmp, compression="uncompressed")
+        os.replace(tmp, FEATHER_PATH)
+    except OSError:
+        logger.warning(f"Could not write feather cache to {FEATHER_PATH}", exc_info=True)
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+
+
+def _read_csv(path: Path) -> pd.DataFrame:
+    """Arrow-backed DataFrame from the CSV, via the feather cache when it is fresh.
+
+    The cache is only used when it records exactly the CSV's current mtime and
+    size; comparing file mtimes would trust a cache written while the CSV was
+    being replaced, or one newer than a CSV copied in with its old mtime kept.
+    """
+    # stat before parsing: if the CSV changes mid-parse, the stamp won't match it
+    source_stat = _source_stat(path)
+    tbl = None
+    if FEATHER_PATH.exists():
+        try:
+            cached = pa_feather.read_table(FEATHER_PATH, memory_map=True)
+            if (cached.schema.metadata or {}).get(FEATHER_SOURCE_KEY) == source_stat:
+                tbl = cached
+        except (OSError, pa.ArrowInvalid):
+            logger.warning(f"Ignoring unreadable feather cache {FEATHER_PATH}", exc_info=True)
+    if tbl is None:
+        tbl = _parse_csv(path)
+        _write_feather_cache(tbl, source_stat)
+    return tbl.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _build_search_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Column-oriented projection of just the searched columns, as Arrow-backed strings.
+
+    Masks are computed against these few columns; the full frame is only sliced
+    once, when a result page or export is materialized.
+    """
+    positions = [i for i, col in enumerate(df.columns) if col.lower() in SEARCH_COLUMNS]
+    return df.iloc[:, positions].astype("string[pyarrow]")
+
+
+def _null_non_finite(df: pd.DataFrame) -> pd.DataFrame:
+    """Turn Inf (and Arrow NaN) into missing values once at load, not per export."""
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_floating(s.dtype.pyarrow_dtype):
+            arr = pa.array(s)
+            finite = pc.is_finite(arr)
+            if not pc.all(finite).as_py():
+                cleaned = pc.if_else(finite, arr, pa.scalar(None, arr.type))
+                df.isetitem(i, pd.Series(pd.arrays.ArrowExtensionArray(cleaned), index=df.index))
+        elif pd.api.types.is_float_dtype(s) and np.isinf(s.to_numpy()).any():
+            df.isetitem(i, s.where(np.isfinite(s)))  # numpy floats: NaN is already missing
+    return df
+
+
+def _categorize_location_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Country/State/City repeat heavily; store them as codes + a small dictionary."""
+    for i, col in enumerate(df.columns):
+        if col.lower() in ("country", "state", "city"):
+            df.isetitem(i, df.iloc[:, i].astype("category"))
+    return df
+
+
+def _build_arrow_cache(search_df: pd.DataFrame) -> Dict[str, List[pa.Array]]:
+    """Lowercased, null-free Arrow copies of the searched columns, one per duplicate header.
+
+    Lowering once here beats match_substring(ignore_case=True) per query, and with
+    nulls filled the kernel's output mask needs no extra fill_null pass.
+    """
+    cache: Dict[str, List[pa.Array]] = {}
+    for i, col in enumerate(search_df.columns):
+        arr = pc.fill_null(pc.utf8_lower(pa.array(search_df.iloc[:, i])), "")
+        cache.setdefault(col, []).append(arr)
+    return cache
+
+
+def _strip_native_pin(search_df: pd.DataFrame) -> List[pa.Array]:
+    """Whitespace-trimmed native_pin, computed once per load (one per duplicate header)."""
+    return [pc.utf8_trim_whitespace(pa.array(search_df.iloc[:, i]))
+            for i, col in enumerate(search_df.columns) if col == "native_pin"]
+
+
+def _build_pin_index(stripped: List[pa.Array]) -> Dict[str, np.ndarray]:
+    """Stripped native_pin -> row positions, for O(1) exact machine lookup."""
+    index: Dict[str, np.ndarray] = {}
+    for arr in stripped:
+        pins = pd.Series(pd.arrays.ArrowExtensionArray(arr))
+        for pin, rows in pins.groupby(pins).indices.items():
+            index[pin] = np.union1d(index[pin], rows) if pin in index else rows
+    return index
+
+
+def _location_columns(df: pd.DataFrame) -> List[str]:
+    cols_lower = {c.lower(): c for c in df.columns}
+    return [cols_lower[c] for c in ("country", "state", "city") if c in cols_lower]
+
+
+def _build_location_haystack(search_df: pd.DataFrame, arrow_cache: Dict[str, List[pa.Array]]):
+    """Dictionary-encoded lowercased `country<US>state<US>city`, one entry per row."""
+    parts = [arr for col in _location_columns(search_df) for arr in arrow_cache[col]]
+    if not parts:
+        return None
+    haystack = pc.binary_join_element_wise(
+        *parts, pa.scalar(LOCATION_SEP, parts[0].type), null_handling="replace", null_replacement=""
+    )
+    if isinstance(haystack, pa.ChunkedArray):
+        haystack = haystack.combine_chunks()
+    # few distinct places: search the dictionary, then gather through the codes
+    return haystack.dictionary_encode()
+
+
+def _build_cache(path: Path, mtime: float) -> Dict[str, Any]:
+    if path.suffix.lower() == ".csv":
+        df = _read_csv(path)
+    else:
+        df = pd.read_excel(path, engine="openpyxl")
+
+    df = _categorize_location_columns(_null_non_finite(_normalize_columns(df)))
+    search_df = _build_search_df(df)
+    arrow = _build_arrow_cache(search_df)
+    haystack = _build_location_haystack(search_df, arrow)
+    codes = counts = None
+    if haystack is not None:
+        codes = haystack.indices.to_numpy()
+        counts = np.bincount(codes, minlength=len(haystack.dictionary))
+    # search_df and the stripped pins are only inputs to the structures below;
+    # not keeping them lets their memory go once the load finishes
+    cache = {
+        "mtime": mtime,
+        "path": str(path),
+        "df": df,
+        "arrow": arrow,
+        "location_haystack": haystack,
+        "location_codes": codes,
+        "location_counts": counts,
+        "pin_index": _build_pin_index(_strip_native_pin(search_df)),
+    }
+    cache.update(_search_memos(cache))
+    logger.info(f"Loaded dataset from {path} with shape {df.shape}")
+    return cache
+
+
+def load_cache() -> Dict[str, Any]:
+    """Current dataset cache, rebuilt when the file's modified time changes."""
+    global _df_cache
     if CSV_PATH.exists():
         path = CSV_PATH
     elif XLSX_PATH.exists():
@@ -63,72 +311,176 @@ def load_data() -> pd.DataFrame:
         )
 
     mtime = path.stat().st_mtime
-    if _df_cache["df"] is None or _df_cache["mtime"] != mtime or _df_cache["path"] != str(path):
-        if path.suffix.lower() == ".csv":
-            try:
-                df = pd.read_csv(path, encoding="utf-8", low_memory=False)
-            except UnicodeDecodeError:
-                df = pd.read_csv(path, encoding="latin1", low_memory=False)
-        else:
-            df = pd.read_excel(path, engine="openpyxl")
+    cache = _df_cache
+    if cache["df"] is None or cache["mtime"] != mtime or cache["path"] != str(path):
+        with _load_lock:
+            cache = _df_cache  # another thread may have reloaded while we waited
+            if cache["df"] is None or cache["mtime"] != mtime or cache["path"] != str(path):
+                cache = _build_cache(path, mtime)
+                _df_cache = cache  # one assignment: readers see the old cache or the new one
+    return cache
 
-        df = _normalize_columns(df)
-        _df_cache["df"] = df
-        _df_cache["mtime"] = mtime
-        _df_cache["path"] = str(path)
-        logger.info(f"Loaded dataset from {path} with shape {df.shape}")
 
-    return _df_cache["df"]
+def load_data() -> pd.DataFrame:
+    """Load CSV (preferred) or XLSX with caching by file modified time."""
+    return load_cache()["df"]
 
 
 # -------------------------------------------
 # SAFE CONTAINS (handles duplicate column names)
 # -------------------------------------------
-def safe_contains_any(obj, text: str) -> pd.Series:
+HYPERSCAN_MIN_QUERY = 4  # shorter patterns don't amortize the database compile
+HYPERSCAN_MAX_HIT_RATIO = 32  # past len(arr) // 32 hits the per-match callback loses to Arrow
+
+_hs_local = threading.local()
+
+
+@lru_cache(maxsize=64)
+def _hs_database(t: str):
+    db = hyperscan.Database()
+    # literal mode: no regex escaping, so the pattern stays as long as the query
+    db.compile(expressions=[t.encode()], flags=[hyperscan.HS_FLAG_CASELESS], literal=True)
+    return db
+
+
+def _hs_scratch(t: str, db):
+    """Per-thread scratch for `db`; one scratch can't serve concurrent scans."""
+    scratches = getattr(_hs_local, "scratches", None)
+    if scratches is None or len(scratches) > 64:
+        scratches = _hs_local.scratches = {}
+    entry = scratches.get(t)
+    if entry is None or entry[0] is not db:  # db recompiled after an lru eviction
+        entry = scratches[t] = (db, hyperscan.Scratch(db))
+    return entry[1]
+
+
+def _hs_contains(arr: pa.StringArray, t: str) -> np.ndarray:
+    """match_substring equivalent that runs Hyperscan over the array's UTF-8 buffer.
+
+    Dense patterns fall back to the Arrow kernel once the hit count passes
+    len(arr) // HYPERSCAN_MAX_HIT_RATIO.
+    """
+    offset_type = np.int64 if pa.types.is_large_string(arr.type) else np.int32
+    offsets = np.frombuffer(arr.buffers()[1], dtype=offset_type)[arr.offset:arr.offset + len(arr) + 1]
+    start, stop = int(offsets[0]), int(offsets[-1])
+    max_hits = len(arr) // HYPERSCAN_MAX_HIT_RATIO
+    ends = []
+
+    def on_match(_id, _from, to, _flags, _ctx):
+        ends.append(to)
+        return len(ends) > max_hits  # True terminates the scan
+
+    db = _hs_database(t)
+    try:
+        db.scan(
+            arr.buffers()[2].slice(start, stop - start),  # zero-copy view, no separators needed
+            match_event_handler=on_match,
+            scratch=_hs_scratch(t, db),
+        )
+    except hyperscan.ScanTerminated:
+        return pc.match_substring(arr, t).to_numpy(zero_copy_only=False)
+    mask = np.zeros(len(arr), dtype=bool)
+    if ends:
+        ends = np.asarray(ends, dtype=np.int64) + start
+        rows = np.searchsorted(offsets, ends - len(t.encode()), side="right") - 1
+        # drop matches that run across a row boundary
+        mask[rows[ends <= offsets[rows + 1]]] = True
+    return mask
+
+
+def _match_substring(arr, t: str) -> np.ndarray:
+    # patterns go to Hyperscan as C strings, so a NUL would silently cut the query short
+    if (hyperscan is not None and len(t) >= HYPERSCAN_MIN_QUERY and "\x00" not in t
+            and (pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type))):
+        chunks = arr.chunks if isinstance(arr, pa.ChunkedArray) else [arr]
+        try:
+            if chunks:
+                return np.concatenate([_hs_contains(c, t) for c in chunks])
+        except hyperscan.error:
+            pass  # pattern Hyperscan won't compile (e.g. over its length limit): use Arrow
+    return pc.match_substring(arr, t).to_numpy(zero_copy_only=False)
+
+
+def _any_contains(arrays: List[pa.Array], t: str) -> np.ndarray:
+    """Row mask: any of the equal-length `arrays` contains lowercased `t`."""
+    if len(arrays) == 1:
+        return _match_substring(arrays[0], t)
+    # duplicate headers: stack the columns (zero-copy chunk list) so one kernel call
+    # scans them all, then OR the (n_columns, n_rows) result down to one mask
+    chunks = [c for arr in arrays
+              for c in (arr.chunks if isinstance(arr, pa.ChunkedArray) else [arr])]
+    mask = _match_substring(pa.chunked_array(chunks, type=arrays[0].type), t)
+    return mask.reshape(len(arrays), -1).any(axis=0)
+
+
+def safe_contains_any(cache: Dict[str, Any], col: str, text: str) -> np.ndarray:
+    """Case-insensitive substring mask for a searched column (Arrow kernel)."""
+    return _any_contains(cache["arrow"][col], str(text).lower())
+
+
+def find_first_k(cache: Dict[str, Any], col: str, text: str, k: int) -> (np.ndarray, int):
+    """Like safe_contains_any, but stops once `k` matches are found.
+
+    Returns the matching row positions and how many rows were scanned.
+    """
     t = str(text).lower()
-    # if df[col] returns DataFrame (duplicate header), OR across all of them
-    if isinstance(obj, pd.DataFrame):
-        mask_df = obj.astype(str).apply(lambda s: s.str.lower().str.contains(t, na=False))
-        return mask_df.any(axis=1)
-    return obj.astype(str).str.lower().str.contains(t, na=False)
+    arrays = cache["arrow"][col]
+    n = len(arrays[0])
+    found = []
+    n_found = 0
+    for off in range(0, n, SCAN_CHUNK_ROWS):
+        mask = _any_contains([arr.slice(off, SCAN_CHUNK_ROWS) for arr in arrays], t)
+        hits = np.flatnonzero(mask) + off
+        found.append(hits)
+        n_found += len(hits)
+        if n_found >= k:
+            return np.concatenate(found), min(off + SCAN_CHUNK_ROWS, n)
+    return (np.concatenate(found) if found else np.empty(0, dtype=np.intp)), n
+
+
+def location_hits(cache: Dict[str, Any], text: str) -> np.ndarray:
+    """Which distinct Country/State/City entries contain `text` (one flag per dictionary entry)."""
+    hits = pc.match_substring(cache["location_haystack"].dictionary, str(text).lower())
+    return hits.to_numpy(zero_copy_only=False)
+
+
+def location_contains(cache: Dict[str, Any], text: str) -> np.ndarray:
+    """Case-insensitive substring mask over Country/State/City in a single pass."""
+    return location_hits(cache, text)[cache["location_codes"]]
+
+
+def location_first_k(cache: Dict[str, Any], hits: np.ndarray, k: int) -> np.ndarray:
+    """Row positions of the first `k` rows whose location entry is flagged in `hits`."""
+    codes = cache["location_codes"]
+    found = []
+    n_found = 0
+    for off in range(0, len(codes), SCAN_CHUNK_ROWS):
+        rows = np.flatnonzero(hits[codes[off:off + SCAN_CHUNK_ROWS]]) + off
+        found.append(rows)
+        n_found += len(rows)
+        if n_found >= k:
+            break
+    return np.concatenate(found)[:k] if found else np.empty(0, dtype=np.intp)
 
 
 # -------------------------------------------
-# JSON SANITIZER (fix for NaN / Inf / numpy types)
+# JSON ROWS (NaN / Inf / numpy types are left to SafeORJSONResponse)
 # -------------------------------------------
-def _json_safe_value(v: Any) -> Any:
-    if v is None:
-        return None
-    try:
-        if pd.isna(v):
-            return None
-    except Exception:
-        pass
-    if isinstance(v, float):
-        if math.isnan(v) or math.isinf(v):
-            return None
-        return v
-    if isinstance(v, (np.floating, np.integer)):
-        vv = v.item()
-        if isinstance(vv, float) and (math.isnan(vv) or math.isinf(vv)):
-            return None
-        return vv
-    if isinstance(v, (pd.Timestamp, np.datetime64)):
-        try:
-            return pd.to_datetime(v).isoformat()
-        except Exception:
-            return str(v)
-    return v
+def _column_values(s: pd.Series) -> List[Any]:
+    if isinstance(s.dtype, pd.ArrowDtype):
+        # Arrow boxes straight to Python objects (None for nulls), ~10x faster than
+        # Series.tolist(), which goes through pandas' NA-aware object conversion
+        return pa.array(s).to_pylist()
+    return s.tolist()
 
 
 def df_to_json_safe(df: pd.DataFrame) -> (List[str], List[Dict[str, Any]]):
     if df is None or df.empty:
         return [], []
-    cleaned = df.replace([np.inf, -np.inf], np.nan).astype(object)
-    cleaned = cleaned.where(pd.notnull(cleaned), None)
-    records = cleaned.to_dict(orient="records")
-    safe_records = [{k: _json_safe_value(v) for k, v in r.items()} for r in records]
-    return cleaned.columns.tolist(), safe_records
+    cols = df.columns.tolist()
+    col_lists = [_column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    rows = [dict(zip(cols, r)) for r in zip(*col_lists)]
+    return cols, rows
 
 
 # -------------------------------------------
@@ -136,8 +488,7 @@ def df_to_json_safe(df: pd.DataFrame) -> (List[str], List[Dict[str, Any]]):
 # -------------------------------------------
 def safe_load_data_or_error():
     try:
-        df = load_data()
-        return df, None
+        return load_cache(), None
     except FileNotFoundError as e:
         logger.exception("Dataset not found")
         return None, JSONResponse(status_code=500, content={"detail": str(e)})
@@ -164,101 +515,182 @@ def home(request: Request):
 
 @app.get("/health")
 def health():
-    df, err = safe_load_data_or_error()
+    cache, err = safe_load_data_or_error()
     if err:
         return err
+    df = cache["df"]
     return {
         "status": "ok",
         "rows": len(df),
         "columns": df.columns.tolist(),
-        "file": _df_cache["path"],
+        "file": cache["path"],
     }
 
 
 # -------------------------------------------
 # SEARCH: MACHINE
 # -------------------------------------------
+SEARCH_CACHE_SIZE = 256  # memoized (query, limit) results per endpoint and dataset load
+FORMAT_QUERY = Query("json", alias="format", pattern="^(json|ndjson)$")
+# shorter queries match almost every row: machine IDs then need an exact hit,
+# and location queries return nothing
+MIN_MACHINE_SUBSTRING = 3
+MIN_LOCATION_QUERY = 2
+
+
+def ndjson_stream(payload: Dict[str, Any]):
+    """Header line (everything but the rows), then one JSON object per row."""
+    yield orjson_dumps({k: v for k, v in payload.items() if k != "rows"}) + b"\n"
+    for row in payload["rows"]:
+        yield orjson_dumps(row) + b"\n"
+
+
+def search_response(payload: Dict[str, Any], fmt: str):
+    if fmt == "ndjson":
+        return StreamingResponse(ndjson_stream(payload), media_type="application/x-ndjson")
+    return SafeORJSONResponse(payload)
+
+
+def _machine_search_payload(cache: Dict[str, Any], mid: str, limit: int) -> Dict[str, Any]:
+    df = cache["df"]
+    note = None
+    idx = cache["pin_index"].get(mid)
+    estimate = None
+    if idx is None and len(mid) < MIN_MACHINE_SUBSTRING:
+        idx = np.empty(0, dtype=np.intp)
+        note = f"No exact match; partial matching needs at least {MIN_MACHINE_SUBSTRING} characters."
+    elif idx is None:
+        idx, scanned = find_first_k(cache, "native_pin", mid, limit)
+        if scanned < len(df):
+            # stopped early: the true count is unknown, extrapolate from the scanned prefix
+            estimate = max(round(len(idx) * len(df) / scanned), len(idx))
+
+    out = df.iloc[idx[:limit]]
+    cols, rows = df_to_json_safe(out)
+    payload = {"query": mid}
+    if estimate is None:
+        payload["matched_rows"] = len(idx)
+    else:
+        payload["matched_rows_estimate"] = estimate
+    payload.update(returned_rows=len(out), columns=cols, rows=rows)
+    if note:
+        payload["note"] = note
+    return payload
+
+
 @app.get("/api/search/machine")
 def search_machine(
     machine_id: str = Query(...),
     limit: int = Query(50, ge=1, le=500),
+    fmt: str = FORMAT_QUERY,
 ):
-    df, err = safe_load_data_or_error()
+    cache, err = safe_load_data_or_error()
     if err:
         return err
-    if "native_pin" not in df.columns:
+    if "native_pin" not in cache["df"].columns:
         raise HTTPException(400, "Column 'native_pin' not found in dataset.")
 
     mid = machine_id.strip()
-    mask = df["native_pin"].astype(str).str.strip().eq(mid)
-    if int(mask.sum()) == 0:
-        mask = safe_contains_any(df["native_pin"], mid)
-
-    out = df.loc[mask].head(limit)
-    cols, rows = df_to_json_safe(out)
-    return JSONResponse(content={
-        "query": mid,
-        "matched_rows": int(mask.sum()),
-        "returned_rows": len(out),
-        "columns": cols,
-        "rows": rows,
-    })
+    return search_response(cache["machine_payload"](mid, limit), fmt)
 
 
 # -------------------------------------------
 # SEARCH: LOCATION (Country/State/City)
 # -------------------------------------------
+def _location_search_payload(cache: Dict[str, Any], q: str, limit: int) -> Dict[str, Any]:
+    if len(q.strip()) < MIN_LOCATION_QUERY:
+        return {
+            "query": q,
+            "matched_rows": 0,
+            "returned_rows": 0,
+            "columns": [],
+            "rows": [],
+            "note": f"Location queries need at least {MIN_LOCATION_QUERY} characters.",
+        }
+
+    df = cache["df"]
+    hits = location_hits(cache, q.strip())
+    # exact count from per-entry row counts; only the first page of rows is located
+    matched = int(cache["location_counts"][hits].sum())
+
+    out = df.iloc[location_first_k(cache, hits, limit)]
+    cols_out, rows_out = df_to_json_safe(out)
+    return {
+        "query": q,
+        "matched_rows": matched,
+        "returned_rows": len(out),
+        "columns": cols_out,
+        "rows": rows_out,
+    }
+
+
 @app.get("/api/search/location")
 def search_location(
     q: str = Query(...),
     limit: int = Query(50, ge=1, le=500),
+    fmt: str = FORMAT_QUERY,
 ):
-    df, err = safe_load_data_or_error()
+    cache, err = safe_load_data_or_error()
     if err:
         return err
-
-    query = q.strip()
-    cols_lower = {c.lower(): c for c in df.columns}
-    country_col = cols_lower.get("country")
-    state_col   = cols_lower.get("state")
-    city_col    = cols_lower.get("city")
-    cols = [c for c in [country_col, state_col, city_col] if c is not None]
-    if not cols:
+    if not _location_columns(cache["df"]):
         raise HTTPException(400, "Country/State/City columns not found in dataset.")
 
-    mask = None
-    for col in cols:
-        m = safe_contains_any(df[col], query)
-        mask = m if mask is None else (mask | m)  # bitwise OR
+    return search_response(cache["location_payload"](q, limit), fmt)
 
-    out = df.loc[mask].head(limit)
-    cols_out, rows_out = df_to_json_safe(out)
-    return JSONResponse(content={
-        "query": q,
-        "matched_rows": int(mask.sum()),
-        "returned_rows": len(out),
-        "columns": cols_out,
-        "rows": rows_out,
-    })
+
+def _search_memos(cache: Dict[str, Any]) -> Dict[str, Any]:
+    """Memoized payload builders bound to one dataset load; a reload starts fresh ones."""
+    return {
+        "machine_payload": lru_cache(maxsize=SEARCH_CACHE_SIZE)(partial(_machine_search_payload, cache)),
+        "location_payload": lru_cache(maxsize=SEARCH_CACHE_SIZE)(partial(_location_search_payload, cache)),
+    }
 
 
 # -------------------------------------------
-# CSV STREAM HELPER
+# CSV STREAM HELPER (Arrow's C++ writer, one batch per chunk)
 # -------------------------------------------
+CSV_BATCH_ROWS = 8192
+CSV_WRITE_OPTIONS = pa_csv.WriteOptions(quoting_style="needed")
+
+
+def _csv_column(s: pd.Series) -> pa.Array:
+    try:
+        return pa.array(s, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed object column (e.g. ints and strings from read_excel): export as text
+        return pa.array(s.astype("string"), from_pandas=True)
+
+
+def _csv_table(df: pd.DataFrame) -> pa.Table:
+    # from_arrays (not Table.from_pandas) so duplicate headers survive; Inf was
+    # nulled at load, and from_pandas maps NaN -> null, so no per-value cleanup
+    return pa.Table.from_arrays(
+        [_csv_column(df.iloc[:, i]) for i in range(df.shape[1])],
+        names=df.columns.tolist(),
+    )
+
+
+def _write_csv_batch(writer: pa_csv.CSVWriter, buffer: BytesIO, batch: pa.RecordBatch) -> bytes:
+    writer.write_batch(batch)
+    chunk = buffer.getvalue()
+    buffer.seek(0); buffer.truncate(0)
+    return chunk
+
+
 def stream_df_as_csv(df: pd.DataFrame, filename: str):
-    def generate():
-        buffer = StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(df.columns.tolist())
+    async def generate():
+        # CPU-bound steps run in worker threads (Arrow releases the GIL) so the
+        # event loop keeps serving other requests between chunks
+        table = await asyncio.to_thread(_csv_table, df)
+        buffer = BytesIO()
+        writer = pa_csv.CSVWriter(buffer, table.schema, write_options=CSV_WRITE_OPTIONS)
         yield buffer.getvalue()
         buffer.seek(0); buffer.truncate(0)
 
-        df2 = df.replace([np.inf, -np.inf], np.nan)
-        for row in df2.itertuples(index=False, name=None):
-            row_out = [("" if (isinstance(v, float) and (math.isnan(v) or math.isinf(v))) else v) for v in row]
-            writer.writerow(row_out)
-            yield buffer.getvalue()
-            buffer.seek(0); buffer.truncate(0)
+        for batch in table.to_batches(max_chunksize=CSV_BATCH_ROWS):
+            yield await asyncio.to_thread(_write_csv_batch, writer, buffer, batch)
+        writer.close()
 
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
     return StreamingResponse(generate(), media_type="text/csv", headers=headers)
@@ -269,43 +701,40 @@ def stream_df_as_csv(df: pd.DataFrame, filename: str):
 # -------------------------------------------
 @app.get("/api/export/machine")
 def export_machine(machine_id: str = Query(...)):
-    df, err = safe_load_data_or_error()
+    cache, err = safe_load_data_or_error()
     if err:
         return err
+    df = cache["df"]
     if "native_pin" not in df.columns:
         raise HTTPException(400, "Column 'native_pin' not found in dataset.")
 
     mid = machine_id.strip()
-    mask = df["native_pin"].astype(str).str.strip().eq(mid)
-    if int(mask.sum()) == 0:
-        mask = safe_contains_any(df["native_pin"], mid)
+    idx = cache["pin_index"].get(mid)
+    if idx is None and len(mid) < MIN_MACHINE_SUBSTRING:
+        idx = np.empty(0, dtype=np.intp)  # same rule as the search endpoint
+    elif idx is None:
+        idx = np.flatnonzero(safe_contains_any(cache, "native_pin", mid))
 
-    out_df = df.loc[mask]
+    out_df = df.iloc[idx]
     filename = f"machine_{mid}_matched_{len(out_df)}.csv".replace(" ", "_")
     return stream_df_as_csv(out_df, filename)
 
 
 @app.get("/api/export/location")
 def export_location(q: str = Query(...)):
-    df, err = safe_load_data_or_error()
+    cache, err = safe_load_data_or_error()
     if err:
         return err
+    df = cache["df"]
 
     query = q.strip()
-    cols_lower = {c.lower(): c for c in df.columns}
-    country_col = cols_lower.get("country")
-    state_col   = cols_lower.get("state")
-    city_col    = cols_lower.get("city")
-    cols = [c for c in [country_col, state_col, city_col] if c is not None]
-    if not cols:
+    if not _location_columns(df):
         raise HTTPException(400, "Country/State/City columns not found in dataset.")
 
-    mask = None
-    for col in cols:
-        m = safe_contains_any(df[col], query)
-        mask = m if mask is None else (mask | m)
-
-    out_df = df.loc[mask]
+    if len(query) < MIN_LOCATION_QUERY:
+        out_df = df.iloc[:0]  # same rule as the search endpoint
+    else:
+        out_df = df.loc[location_contains(cache, query)]
     filename = f"location_{q}_matched_{len(out_df)}.csv".replace(" ", "_")
     return stream_df_as_csv(out_df, filename)
 
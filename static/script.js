@@ -106,11 +106,15 @@ window.onload = function boot() {
     const rows = data.rows || [];
     lastResult = data;
 
-    matchedPill.textContent = `Matched: ${data.matched_rows}`;
+    // partial machine scans stop early and only report an extrapolated count
+    const matched = data.matched_rows ?? `~${data.matched_rows_estimate}`;
+    matchedPill.textContent = `Matched: ${matched}`;
     returnedPill.textContent = `Returned: ${rows.length}`;
     downloadBtn.disabled = false; copyJsonBtn.disabled = false;
 
-    let html = `<div class="result-meta">Matched: <b>${escapeHtml(data.matched_rows)}</b> • Returned: <b>${escapeHtml(rows.length)}</b></div>`;
+    let html = `<div class="result-meta">Matched: <b>${escapeHtml(matched)}</b> • Returned: <b>${escapeHtml(rows.length)}</b>`;
+    if (data.note) html += ` • ${escapeHtml(data.note)}`;
+    html += `</div>`;
     html += `<div class="result-table-wrap"><table class="result-table"><thead><tr>`;
     html += cols.map(c => `<th>${escapeHtml(c)}</th>`).join("");
     html += `</tr></thead><tbody>`;